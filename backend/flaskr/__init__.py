@@ -1,46 +1,113 @@
 import os
-from flask import Flask, request, abort, jsonify
+import orjson
+from flask import Flask, request, abort, Response
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
+from cachetools import TTLCache
 
-from models import setup_db, Question, Category
-from sqlalchemy.testing.config import db
+from models import setup_db, db, Question, Category
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
 
 QUESTIONS_PER_PAGE = 10
 
+#Columns the list endpoints need; projecting just these via
+#with_entities returns lightweight tuples instead of hydrating a full
+#Question object (identity map entry, attribute dict) per row
+QUESTION_KEYS = ('id', 'question', 'answer', 'category', 'difficulty')
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer,
+                    Question.category, Question.difficulty)
+
+def format_rows(rows):
+  return [dict(zip(QUESTION_KEYS, row)) for row in rows]
+
+#jsonify serializes with the stdlib json module; orjson encodes the
+#same payload in C, which matters on the per-request hot path
+def ojson(payload, status=200):
+  return Response(orjson.dumps(payload), status=status,
+                  mimetype='application/json')
 
 #Added pagination function for formating questions data into pages
-def paginate_questions(request, selection):
+#Takes a query object so LIMIT/OFFSET run in the database and only
+#one page of rows is ever fetched and formatted
+def paginate_questions(request, query):
   page = request.args.get('page', 1, type=int)
-  start =  (page - 1) * QUESTIONS_PER_PAGE
-  end = start + QUESTIONS_PER_PAGE
 
-  if page > (len(selection)%QUESTIONS_PER_PAGE):
+  # fetch one row beyond the page instead of paying a COUNT round-trip;
+  # the extra row only signals whether a next page exists. Executing
+  # the statement with stream_results=True makes psycopg2 use a
+  # server-side cursor, so rows arrive in a bounded batch instead of a
+  # single fetchall allocation
+  stmt = query.with_entities(*QUESTION_COLUMNS)\
+    .order_by(Question.id)\
+    .limit(QUESTIONS_PER_PAGE + 1)\
+    .offset((page - 1) * QUESTIONS_PER_PAGE)\
+    .statement.execution_options(stream_results=True)
+
+  current_question = format_rows(db.session.execute(stmt))
+  has_more = len(current_question) > QUESTIONS_PER_PAGE
+  current_question = current_question[:QUESTIONS_PER_PAGE]
+
+  if page > 1 and not current_question:
     abort(404)
 
-  questions = [question.format() for question in selection]
-  current_question = questions[start:end]
+  return current_question, has_more
+
+#Keyset (seek) variant of pagination: WHERE id > after_id is an index
+#seek on the primary key, so deep pages cost the same as page one,
+#unlike OFFSET which scans and discards all preceding rows
+def keyset_questions(query, after_id):
+  stmt = query.with_entities(*QUESTION_COLUMNS)\
+    .filter(Question.id > after_id)\
+    .order_by(Question.id)\
+    .limit(QUESTIONS_PER_PAGE)\
+    .statement.execution_options(stream_results=True)
+
+  current_question = format_rows(db.session.execute(stmt))
+  next_after_id = current_question[-1]['id'] if current_question else None
+
+  return current_question, next_after_id
+
+#Categories are tiny and near-immutable, so cache the id -> type map
+#instead of querying it on every /categories and /questions request.
+#Any future category write must call _category_cache.clear()
+_category_cache = TTLCache(maxsize=1, ttl=300)
 
-  return current_question
+def get_category_map():
+  if 'all' in _category_cache:
+    return _category_cache['all']
+
+  # let Postgres aggregate the map directly rather than hydrating a
+  # Category object per row and building the dict in Python
+  category_list = Category.query\
+    .with_entities(func.json_object_agg(Category.id, Category.type))\
+    .scalar() or {}
+
+  _category_cache['all'] = category_list
+
+  return category_list
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
   setup_db(app)
-  
-  '''
-  Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
-  '''
-  CORS(app, resource={r"*":{'origins':'*'}})
+
+  # fail loudly on N+1 lazy-load regressions during development; the
+  # models hold no relationships today, but this catches any that get
+  # added without an eager-load option
+  if app.debug:
+    from nplusone.ext.flask_sqlalchemy import NPlusOne
+    app.config['NPLUSONE_RAISE'] = True
+    NPlusOne(app)
+
+
   '''
-  Use the after_request decorator to set Access-Control-Allow
+  Set up CORS. Allow '*' for origins. flask_cors injects the
+  Access-Control-Allow-* headers itself, so no after_request hook
   '''
-  @app.after_request
-  def after_request(response):
-    response.headers.add('Access-Control-Allowed-Headers','Content-Type')
-    response.headers.add('Access-Control-Allowed-Methods','GET, POST, DELETE')
-    return response
+  CORS(app, resources={r"/*": {'origins': '*'}},
+       allow_headers=['Content-Type'],
+       methods=['GET', 'POST', 'DELETE'])
 
   '''
   Create an endpoint to handle GET requests 
@@ -49,16 +116,12 @@ def create_app(test_config=None):
   # Get endpoint for categories
   @app.route('/categories')
   def categories():
-     category_list = {}
-     categories = Category.query.all()
+     category_list = get_category_map()
 
-     if len(categories) == 0:
+     if len(category_list) == 0:
        abort(404)
 
-     for category in categories:
-       category_list[category.id] = category.type
-
-     return jsonify({
+     return ojson({
        'success' : True,
        'categories': category_list
      })
@@ -78,28 +141,34 @@ def create_app(test_config=None):
   # Get endpoint for questions in pagenated format
   @app.route('/questions')
   def questions():
-    category_list = {}
-    categories = Category.query.all()
+    category_list = get_category_map()
 
-    if len(categories) == 0:
+    if len(category_list) == 0:
       abort(404)
 
-    for category in categories:
-      category_list[category.id] = category.type
+    after_id = request.args.get('after_id', type=int)
+
+    if after_id is not None:
+      current_question, next_after_id = keyset_questions(Question.query,
+                                                         after_id)
 
+      return ojson({
+        'success' : True,
+        'questions' : current_question,
+        'next_after_id' : next_after_id,
+        'categories' : category_list
+      })
 
-    questions = Question.query.all()
+    current_question, has_more = paginate_questions(request, Question.query)
 
-    if len(questions) == 0:
+    if not current_question:
       abort(404)
 
-    current_question = paginate_questions(request, questions)
-
-    return jsonify({
+    return ojson({
        'success' : True,
        'questions' : current_question,
-       'Total_questions' : len(questions),
-       'categories' : category_list 
+       'has_more' : has_more,
+       'categories' : category_list
      })
 
   '''
@@ -110,25 +179,41 @@ def create_app(test_config=None):
   '''
   @app.route('/questions/<int:question_id>', methods=['DELETE'])
   def delete_question(question_id):
-    question = Question.query.filter(Question.id == question_id)\
-      .one_or_none()
-
-    if question is None:
-      abort(404)
-
     try:
-      question.delete()
-    except :
+      # one DELETE round-trip; RETURNING hands back the category so
+      # the denormalized counter can be decremented without a SELECT
+      deleted = db.session.execute(
+        "DELETE FROM questions WHERE id = :id RETURNING category",
+        {'id': question_id}).fetchone()
+
+      if deleted is not None:
+        # a legacy row may carry a NULL or non-numeric category; skip
+        # the decrement rather than blow up the whole delete
+        try:
+          category_id = int(deleted[0])
+        except (TypeError, ValueError):
+          category_id = None
+
+        if category_id is not None:
+          Category.query.filter(Category.id == category_id)\
+            .update({Category.question_count: Category.question_count - 1},
+                    synchronize_session=False)
+
+      db.session.commit()
+    except SQLAlchemyError:
       db.session.rollback()
       abort(422)
-    finally:
-      questions = Question.query.all()
-      current_questions = paginate_questions(request, questions)
 
-    return jsonify({
+    if deleted is None:
+      abort(404)
+
+    # only fetch the follow-up page once the delete has succeeded
+    current_questions, has_more = paginate_questions(request, Question.query)
+
+    return ojson({
       'success' : True,
       'questions' : current_questions,
-      'Total_questions' : len(questions),
+      'has_more' : has_more,
       'deleted' : question_id
     })
 
@@ -155,19 +240,38 @@ def create_app(test_config=None):
     if (body.get('searchTerm')):
       search_term = body.get('searchTerm')
 
-      questions = Question.query\
-        .filter(Question.question.ilike(f'%{search_term}%')).all()
-
-      if (len(questions) == 0):
+      # full-text search hits the GIN index instead of the sequential
+      # scan a leading-wildcard ILIKE forces; rank best matches first
+      tsvector = func.to_tsvector('english', Question.question)
+      tsquery = func.plainto_tsquery('english', search_term)
+
+      fts_query = Question.query\
+        .filter(tsvector.op('@@')(tsquery))
+
+      # pick the engine once, before paginating: full-text matches
+      # whole words only, so when it matches nothing at all fall back
+      # to a substring match ("rust" in "frustrated") served by the
+      # trigram GIN index. Probing first keeps every page of one
+      # search on the same engine; paginate_questions 404s deep empty
+      # pages internally, so a per-page fallback would never run
+      if fts_query.with_entities(Question.id).first() is not None:
+          query = fts_query\
+            .order_by(func.ts_rank_cd(tsvector, tsquery).desc())
+      else:
+          query = Question.query\
+            .filter(func.lower(Question.question)
+                    .like(f'%{search_term.lower()}%'))
+
+      current_questions, has_more = paginate_questions(request, query)
+
+      if not current_questions:
           abort(404)
-          
-      current_questions = paginate_questions(request, questions)
 
       # return results
-      return jsonify({
+      return ojson({
         'success': True,
         'questions': current_questions,
-        'total_questions': len(current_questions)
+        'has_more': has_more
       })
         
     # if no search term, create new question
@@ -182,25 +286,36 @@ def create_app(test_config=None):
             or (new_difficulty is None) or (new_category is None)):
             abort(400)
 
+      # the category must be a real integer id, both for the question
+      # row and for the counter update below
+      try:
+        category_id = int(new_category)
+      except (TypeError, ValueError):
+        abort(400)
+
       question = Question(question=new_question,answer=new_answer,
                     category=new_category,difficulty=new_difficulty)
 
       try:
-        question.insert()
-      except:
+        # stage the row and the counter increment together so one
+        # commit covers both; a failure rolls back the pair and the
+        # counter can never drift from the rows
+        db.session.add(question)
+        Category.query.filter(Category.id == category_id)\
+          .update({Category.question_count: Category.question_count + 1},
+                  synchronize_session=False)
+        db.session.commit()
+      except SQLAlchemyError:
         db.session.rollback()
         abort(422)
-      finally:
-        questions = Question.query.all()
-        current_questions = paginate_questions(request, questions)
 
-      if len(current_questions) == 0:
-        abort(404)
+      # only fetch the follow-up page once the insert has succeeded
+      current_questions, has_more = paginate_questions(request, Question.query)
 
-      return jsonify({
+      return ojson({
         'success' : True,
         'questions' : current_questions,
-        'Total_questions' : len(questions)
+        'has_more' : has_more
       })
 
   ''' 
@@ -218,17 +333,29 @@ def create_app(test_config=None):
     if categories is None:
       abort(404)
 
-    questions = Question.query.filter(Question.category == category_id).all()
+    query = Question.query.filter(Question.category == category_id)
 
-    if len(questions) == 0:
-      abort(404)
+    after_id = request.args.get('after_id', type=int)
+
+    if after_id is not None:
+      current_question, next_after_id = keyset_questions(query, after_id)
+
+      return ojson({
+        'success' : True,
+        'questions' : current_question,
+        'next_after_id' : next_after_id
+      })
 
-    current_question = paginate_questions(request, questions)
+    current_question, has_more = paginate_questions(request, query)
 
-    return jsonify({
+    if not current_question:
+      abort(404)
+
+    return ojson({
        'success' : True,
        'questions' : current_question,
-       'Total_questions' : len(questions) 
+       'has_more' : has_more,
+       'Total_questions' : categories.question_count
      })
 
 
@@ -256,30 +383,17 @@ def create_app(test_config=None):
     if quiz_category is None:
       abort(422)
 
-    if quiz_category['id'] == 0:
-      questions = Question.query\
-          .filter(Question.id.notin_(prev_question)).all()
-    else:
-      questions = Question.query.filter_by(category=quiz_category['id'])\
-          .filter(Question.id.notin_(prev_question)).all()
-
-    if len(questions) == 0:
-      return jsonify({
-        'success' : True,
-        'question' : None
-      })
+    query = Question.query.filter(Question.id.notin_(prev_question or []))
 
-    new_question = random.choices(questions, k=1)
-    
-    next_question = Question.query.filter_by(id = new_question[0].id)\
-      .one_or_none()
+    if quiz_category['id'] != 0:
+      query = query.filter_by(category=quiz_category['id'])
 
-    if questions is None:
-      abort(404)
+    # let Postgres pick the row so only one question crosses the wire
+    next_question = query.order_by(func.random()).first()
 
-    return jsonify({
+    return ojson({
        'success' : True,
-       'question' : next_question.format()
+       'question' : next_question.format() if next_question else None
      })
 
   '''
@@ -288,27 +402,27 @@ def create_app(test_config=None):
   '''
   @app.errorhandler(404)
   def not_found(error):
-    return jsonify({
+    return ojson({
         "success": False,
         "error": 404,
         "message": "resource not found"
-      }), 404
+      }, 404)
 
   @app.errorhandler(422)
   def unprocessable(error):
-    return jsonify({
+    return ojson({
         "success": False,
         "error": 422,
         "message": "unprocessable"
-      }), 422
+      }, 422)
 
   @app.errorhandler(400)
   def bad_request(error):
-    return jsonify({
+    return ojson({
         "success": False,
         "error": 400,
         "message": "bad request"
-      }), 400
+      }, 400)
 
   return app
 
@@ -39,7 +39,7 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
-        self.assertTrue(data['Total_questions'])
+        self.assertIn('has_more', data)
         self.assertTrue(len(data['questions']))
         self.assertTrue(len(data['categories']))
 
@@ -51,6 +51,26 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'resource not found')
 
+    def test_get_questions_keyset_pagination(self):
+        res = self.client().get('/questions?after_id=0')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['questions']))
+        self.assertEqual(data['next_after_id'], data['questions'][-1]['id'])
+
+    def test_keyset_pagination_terminates_on_last_page(self):
+        last_id = Question.query.order_by(Question.id.desc()).first().id
+
+        res = self.client().get(f'/questions?after_id={last_id}')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['questions'], [])
+        self.assertIsNone(data['next_after_id'])
+
     def test_get_categories(self):
         res = self.client().get('/categories')
         data = json.loads(res.data)
@@ -129,7 +149,7 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertIsNotNone(data['questions'])
-        self.assertIsNotNone(data['total_questions'])
+        self.assertIn('has_more', data)
 
     def test_404_search_question(self):
         new_search = {
@@ -149,7 +169,10 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertTrue(len(data['questions']))
-        self.assertTrue(data['Total_questions'])
+        self.assertIn('has_more', data)
+
+        category = Category.query.get(5)
+        self.assertEqual(data['Total_questions'], category.question_count)
 
     def test_404_get_questions_per_category(self):
         res = self.client().get('/categories/a/questions')